@@ -1,4 +1,5 @@
 import json
+import logging
 import litellm
 from litellm._service_logger import Span
 from litellm.integrations.custom_logger import CustomLogger
@@ -10,6 +11,7 @@ from litellm.types.guardrails import Role
 from litellm.types.utils import (
     LLMResponseTypes,
 )
+import functools
 import hashlib
 
 # 立即应用 Usage 类的 patch
@@ -26,22 +28,19 @@ def _apply_usage_patch():
         original_init = Usage.__init__
         
         def patched_init(self, *args, **kwargs):
-            verbose_logger.warning(f"************* Usage.__init__ called with kwargs: {list(kwargs.keys())} *************")
+            if verbose_logger.isEnabledFor(logging.WARNING):
+                verbose_logger.warning("************* Usage.__init__ called with kwargs: %s *************", list(kwargs.keys()))
             
             # 处理 Kimi 的 cached_tokens 字段
             if "cached_tokens" in kwargs:
                 cached_tokens = kwargs["cached_tokens"]
-                verbose_logger.warning(f"************* Found cached_tokens={cached_tokens}, mapping to cache_read_input_tokens *************")
+                if verbose_logger.isEnabledFor(logging.WARNING):
+                    verbose_logger.warning("************* Found cached_tokens=%s, mapping to cache_read_input_tokens *************", cached_tokens)
                 # 映射到标准字段
                 kwargs["cache_read_input_tokens"] = cached_tokens
             
-            # 调用原始构造函数
+            # 调用原始构造函数（原始构造函数会把额外的 kwargs 设置为属性，cached_tokens 也在其中）
             original_init(self, *args, **kwargs)
-            
-            # 确保 cached_tokens 属性存在（供客户端访问）
-            if "cached_tokens" in kwargs:
-                setattr(self, "cached_tokens", kwargs["cached_tokens"])
-                verbose_logger.warning(f"************* Set cached_tokens attribute: {kwargs['cached_tokens']} *************")
         
         # 应用 patch
         Usage.__init__ = patched_init
@@ -60,48 +59,46 @@ def _apply_response_api_usage_patch():
     try:
         from litellm.types.llms.openai import ResponseAPIUsage
         
-        # 使用 object.__getattribute__ 避免触发 patch 检查
         # 检查是否已经被patch过
-        try:
-            object.__getattribute__(ResponseAPIUsage, '_langfuse_compat_patched')
-            return  # 已经 patch 过，直接返回
-        except AttributeError:
-            pass  # 没有 patch 过，继续
+        if hasattr(ResponseAPIUsage, '_langfuse_compat_patched'):
+            return
+        
+        # 保存原始的 __getattr__（pydantic 用它处理 extra/private 字段）
+        original_getattr = getattr(ResponseAPIUsage, '__getattr__', None)
         
-        # 保存原始的 __getattribute__ 方法
-        original_getattribute = ResponseAPIUsage.__getattribute__
+        # 字段名 -> 映射源字段名
+        compat_fields = {
+            'prompt_tokens': 'input_tokens',
+            'completion_tokens': 'output_tokens',
+        }
         
-        def patched_getattribute(self, name):
-            """拦截属性访问，提供兼容字段映射
+        def patched_getattr(self, name):
+            """仅在正常属性查找失败时调用，提供兼容字段映射
             
             优先级：
-            1. 如果字段本身存在（官方已修复），直接返回
+            1. 如果字段本身存在（官方已修复），走正常查找，不会进入这里
             2. 如果字段不存在但有映射源（input_tokens/output_tokens），返回映射值
             3. 否则抛出 AttributeError
             """
-            # 先尝试正常访问（官方修复后会成功）
-            try:
-                return original_getattribute(self, name)
-            except AttributeError:
-                # 字段不存在，尝试映射
-                if name == 'prompt_tokens':
-                    try:
-                        return original_getattribute(self, 'input_tokens')
-                    except AttributeError:
-                        pass  # input_tokens 也不存在，继续抛出原错误
-                elif name == 'completion_tokens':
-                    try:
-                        return original_getattribute(self, 'output_tokens')
-                    except AttributeError:
-                        pass  # output_tokens 也不存在，继续抛出原错误
-                
-                # 重新抛出原始 AttributeError
-                raise
+            if original_getattr is not None:
+                try:
+                    return original_getattr(self, name)
+                except AttributeError:
+                    if name not in compat_fields:
+                        raise
+            
+            source = compat_fields.get(name)
+            if source is None:
+                raise AttributeError(
+                    f"'{type(self).__name__}' object has no attribute '{name}'"
+                )
+            # 映射源也不存在时 object.__getattribute__ 会抛出 AttributeError
+            return object.__getattribute__(self, source)
         
         # 应用 patch
-        ResponseAPIUsage.__getattribute__ = patched_getattribute
+        ResponseAPIUsage.__getattr__ = patched_getattr
         ResponseAPIUsage._langfuse_compat_patched = True
-        verbose_logger.warning("************* Successfully patched ResponseAPIUsage.__getattribute__ for Langfuse compatibility *************")
+        verbose_logger.warning("************* Successfully patched ResponseAPIUsage.__getattr__ for Langfuse compatibility *************")
         
     except Exception as e:
         verbose_logger.exception(f"Failed to patch ResponseAPIUsage: {e}")
@@ -109,17 +106,54 @@ def _apply_response_api_usage_patch():
 # 立即执行patch
 _apply_response_api_usage_patch()
 
+# type -> 是否有 model_dump 方法
+_HAS_MODEL_DUMP = {}
+
+@functools.lru_cache(maxsize=256)
+def _is_bedrock_claude(api_base: str, litellm_model_name: str) -> bool:
+    """是否是 AWS Bedrock 上的 Claude 模型（有上限的缓存，model 名可能来自客户端）"""
+    return (
+        'bedrock-runtime' in api_base
+        and 'amazonaws.com' in api_base
+        and 'claude' in litellm_model_name.lower()
+    )
+
+@functools.lru_cache(maxsize=4096)
+def _pick_deployment_id(session_id: str, deployments_key: Tuple[Tuple[Any, int], ...]) -> Any:
+    """根据 session_id 在 (model_id, weight) 列表中按权重选出 model_id"""
+    sorted_deployments = sorted(deployments_key, key=lambda item: item[0])
+    
+    total_weight = sum(weight for _, weight in sorted_deployments)
+    if total_weight == 0: # 如果所有权重都为0, 则只考虑index
+        total_weight = len(sorted_deployments)
+    
+    random_num = int.from_bytes(hashlib.blake2b(session_id.encode(), digest_size=8, usedforsecurity=False).digest(), "big")
+    hash_value = random_num % total_weight
+    verbose_logger.warning(
+        "availible length:%s, random_num:%s, total_weight:%s, hash_value:%s",
+        len(sorted_deployments), random_num, total_weight, hash_value,
+    )
+    
+    calc_weight = 0
+    selected_id = sorted_deployments[0][0]
+    
+    for model_id, weight in sorted_deployments:
+        if weight == 0:
+            weight = 1
+        calc_weight += weight
+        if hash_value < calc_weight:
+            selected_id = model_id
+            break
+    
+    return selected_id
+
 class MyCustomHandler(CustomLogger):
     def __init__(self):
         self.default_weight = 40
-        self._patched = False
     
     # 移除之前的 _patch_usage_class 方法，因为我们在模块级别已经patch了
     
     def _patch_bedrock_messages_cache_control(self):
-        if self._patched:
-            return
-            
         try:
             import litellm.litellm_core_utils.prompt_templates.factory as factory_module
             original_bedrock_messages_pt_async = factory_module.BedrockConverseMessagesProcessor._bedrock_converse_messages_pt_async
@@ -132,7 +166,9 @@ class MyCustomHandler(CustomLogger):
                 user_continue_message=None,
                 assistant_continue_message=None,
             ):
-                verbose_logger.warning("DEBUG: Simplified async bedrock messages processing")
+                warn_enabled = verbose_logger.isEnabledFor(logging.WARNING)
+                if warn_enabled:
+                    verbose_logger.warning("DEBUG: Simplified async bedrock messages processing")
                 result = await original_bedrock_messages_pt_async(
                     messages, model, llm_provider, user_continue_message, assistant_continue_message
                 )
@@ -143,17 +179,20 @@ class MyCustomHandler(CustomLogger):
                             # 在content数组的最后添加一个新的ContentBlock，只包含cachePoint
                             cache_block = {"cachePoint": bedrock_cache_point}
                             last_message["content"].append(cache_block)
-                            verbose_logger.warning("DEBUG: Added cache point as separate ContentBlock")
+                            if warn_enabled:
+                                verbose_logger.warning("DEBUG: Added cache point as separate ContentBlock")
                         else:
                             # 如果content不是列表，在message级别添加cachePoint
                             last_message["cachePoint"] = bedrock_cache_point
-                            verbose_logger.warning("DEBUG: Added cache point at message level")
+                            if warn_enabled:
+                                verbose_logger.warning("DEBUG: Added cache point at message level")
                 return result
             
             # 应用patch
             factory_module.BedrockConverseMessagesProcessor._bedrock_converse_messages_pt_async = patched_bedrock_messages_pt_async
             
-            self._patched = True
+            # patch 成功后用实例属性遮蔽该方法，后续调用直接是空操作
+            self._patch_bedrock_messages_cache_control = lambda: None
             verbose_logger.warning("Successfully applied simplified bedrock cache_control patch")
             
         except Exception as e:
@@ -188,32 +227,20 @@ class MyCustomHandler(CustomLogger):
         
         # 简单策略: healthy_deployments 按照 id 和 weight 排序， 同一个session_id, 取同一个位置的deployment
         availible_deployments = [deployment for deployment in healthy_deployments if self._get_model_name(deployment) == model]
-        sorted_deployments = sorted(availible_deployments, key=self._get_model_id)
-        
-        total_weight = sum(self._get_weight(deployment) for deployment in sorted_deployments)
-        if total_weight == 0: # 如果所有权重都为0, 则只考虑index
-            total_weight = len(sorted_deployments)
-        
-        random_num = int(hashlib.md5(session_id.encode()).hexdigest(), 16)
-        hash_value = random_num % total_weight
-        verbose_logger.warning(f"input length:{len(healthy_deployments)}, availible length:{len(availible_deployments)}, random_num:{random_num}, total_weight:{total_weight}, hash_value:{hash_value}")
-        
-        calc_weight = 0
-        selected = sorted_deployments[0]
-        
-        for deployment in sorted_deployments:
-            weight = self._get_weight(deployment)
-            if weight == 0:
-                weight = 1  
-            calc_weight += weight
-            if hash_value < calc_weight:
-                selected = deployment
-                break
+        deployments_key = tuple(
+            (self._get_model_id(deployment), self._get_weight(deployment)) for deployment in availible_deployments
+        )
         
-        model_name = self._get_model_name(selected)
-        model_id = self._get_model_id(selected)
+        # 同一个 session 在部署列表不变时结果固定，排序和哈希只在缓存未命中时计算
+        model_id = _pick_deployment_id(session_id, deployments_key)
+        selected = next(
+            deployment for deployment in availible_deployments if self._get_model_id(deployment) == model_id
+        )
         
-        verbose_logger.warning(f"availible length:{len(availible_deployments)},  session_id: {session_id}, model_id: {model_id}, model_name: {model_name}")
+        verbose_logger.warning(
+            "availible length:%s,  session_id: %s, model_id: %s, model_name: %s",
+            len(availible_deployments), session_id, model_id, self._get_model_name(selected),
+        )
         
         return [selected]
 
@@ -226,40 +253,36 @@ class MyCustomHandler(CustomLogger):
         metadata = litellm_params.get("metadata") or {}
         deployment = metadata.get('deployment', None)
         
-        verbose_logger.warning(f"************* deployment: {deployment} *************")
+        verbose_logger.warning("************* deployment: %s *************", deployment)
         if deployment:
             try:
                 model_info = litellm.get_model_info(deployment)
             except Exception as e:
-                verbose_logger.warning(f"************* get_model_info from deployment {deployment} failed. error: {e}. fallback to model_info in litellm_params *************")
+                verbose_logger.warning("************* get_model_info from deployment %s failed. error: %s. fallback to model_info in litellm_params *************", deployment, e)
                 model_info = metadata.get("model_info", None)
         else:
             model_info = metadata.get("model_info", None)
             if model_info is None:
                 return False, 0
-        verbose_logger.warning(f"************* Model info: {model_info} *************")
-        verbose_logger.warning(f"************* Usage dict: {usage_dict} *************")
+        verbose_logger.warning("************* Model info: %s *************", model_info)
+        verbose_logger.warning("************* Usage dict: %s *************", usage_dict)
         
         if model_info is None:
             return False, 0
         
-        if model_info.get('input_cost_per_token', None) is None:
+        input_cost_per_token = model_info.get('input_cost_per_token')
+        if input_cost_per_token is None:
             return False, 0
         
-        def safe_value(value, default=0):
-            if value is None:
-                return default
-            return value
+        # `or 0` 把 None 统一当作 0 处理
+        output_cost_per_token = model_info.get('output_cost_per_token') or 0
+        cache_read_cost_per_token = model_info.get('cache_read_input_token_cost') or 0
+        cache_creation_cost_per_token = model_info.get('cache_creation_input_token_cost') or 0
         
-        input_cost_per_token = safe_value(model_info.get('input_cost_per_token', 0))
-        output_cost_per_token = safe_value(model_info.get('output_cost_per_token', 0))
-        cache_read_cost_per_token = safe_value(model_info.get('cache_read_input_token_cost', 0))
-        cache_creation_cost_per_token = safe_value(model_info.get('cache_creation_input_token_cost', 0))
-        
-        prompt_tokens = safe_value(usage_dict.get('prompt_tokens', 0))
-        completion_tokens = safe_value(usage_dict.get('completion_tokens', 0))
-        cache_read_tokens = safe_value(usage_dict.get('cache_read_input_tokens', 0))
-        cache_creation_tokens = safe_value(usage_dict.get('cache_creation_input_tokens', 0))
+        prompt_tokens = usage_dict.get('prompt_tokens') or 0
+        completion_tokens = usage_dict.get('completion_tokens') or 0
+        cache_read_tokens = usage_dict.get('cache_read_input_tokens') or 0
+        cache_creation_tokens = usage_dict.get('cache_creation_input_tokens') or 0
         
         actual_input_tokens = prompt_tokens - cache_read_tokens
         input_cost = actual_input_tokens * input_cost_per_token
@@ -270,20 +293,32 @@ class MyCustomHandler(CustomLogger):
         total_cost = input_cost + cache_read_cost + cache_creation_cost + output_cost
         return True, total_cost
 
+    def _to_dict(self, obj) -> dict:
+        # 复制一份，后续修改不影响原始 usage_obj
+        if obj is None:
+            return {}
+        if isinstance(obj, dict):
+            return dict(obj)
+        # 按类型缓存是否有 model_dump，避免每次 hasattr 走 AttributeError 分支
+        cls = type(obj)
+        has_dump = _HAS_MODEL_DUMP.get(cls)
+        if has_dump is None:
+            has_dump = _HAS_MODEL_DUMP[cls] = hasattr(cls, 'model_dump')
+        if has_dump:
+            return obj.model_dump()
+        return dict(obj.__dict__)
+
     def _preprocess_usage_dict(self, usage_obj, model_name: Optional[str] = None, kwargs: dict = None):
-        usage_dict = (
-            usage_obj.model_dump() 
-            if hasattr(usage_obj, 'model_dump') 
-            else usage_obj.__dict__
-        )
+        # 完整的 usage（会写入 hidden_params["usage_object"]，其他 logger 依赖完整字段）
+        usage_dict = self._to_dict(usage_obj)
         
-        if "prompt_tokens_details" not in usage_dict or usage_dict["prompt_tokens_details"] is None:
-            usage_dict["prompt_tokens_details"] = {}
+        if not isinstance(usage_dict.get("prompt_tokens_details"), dict):
+            usage_dict["prompt_tokens_details"] = self._to_dict(usage_dict.get("prompt_tokens_details"))
 
         # AWS Bedrock Claude token修复 - 通过API Base URL AND litellm_model_name识别
         if kwargs:
             litellm_params = kwargs.get('litellm_params', {})
-            api_base = litellm_params.get('api_base', '')
+            api_base = litellm_params.get('api_base') or ''
             
             # 获取litellm_model_name的几种可能方式
             litellm_model_name = (
@@ -294,43 +329,32 @@ class MyCustomHandler(CustomLogger):
             )
             
             # 通过API Base URL AND litellm_model_name识别AWS Bedrock (两个条件必须同时满足)
-            is_aws_bedrock_api = 'bedrock-runtime' in api_base and 'amazonaws.com' in api_base
-            is_claude_model = 'claude' in litellm_model_name.lower()
-            
-            if is_aws_bedrock_api and is_claude_model:
+            if _is_bedrock_claude(api_base, litellm_model_name):
                 # 获取原始值
-                original_prompt_tokens = usage_dict.get("prompt_tokens", 0)
-                cache_creation_tokens = usage_dict.get("cache_creation_input_tokens", 0)
-                cache_read_tokens = usage_dict.get("cache_read_input_tokens", 0)
-                completion_tokens = usage_dict.get("completion_tokens", 0)
+                original_prompt_tokens = usage_dict.get("prompt_tokens") or 0
+                cache_creation_tokens = usage_dict.get("cache_creation_input_tokens") or 0
+                cache_read_tokens = usage_dict.get("cache_read_input_tokens") or 0
+                completion_tokens = usage_dict.get("completion_tokens") or 0
                 
                 # AWS Bedrock修正: prompt_tokens = 原始prompt_tokens + cache_creation + cache_read
                 corrected_prompt_tokens = original_prompt_tokens + cache_creation_tokens + cache_read_tokens
                 corrected_total_tokens = completion_tokens + corrected_prompt_tokens
                 
-                verbose_logger.warning(
-                    f"************* AWS Bedrock Claude Token Fix - Conditions Matched *************\n"
-                    f"API condition satisfied: {is_aws_bedrock_api} (api_base: {api_base})\n"
-                    f"Model condition satisfied: {is_claude_model} (litellm_model_name: {litellm_model_name})\n"
-                    f"Original prompt_tokens: {original_prompt_tokens}\n"
-                    f"cache_creation_input_tokens: {cache_creation_tokens}\n" 
-                    f"cache_read_input_tokens: {cache_read_tokens}\n"
-                    f"Corrected prompt_tokens: {original_prompt_tokens} + {cache_creation_tokens} + {cache_read_tokens} = {corrected_prompt_tokens}\n"
-                    f"Corrected total_tokens: {completion_tokens} + {corrected_prompt_tokens} = {corrected_total_tokens}"
-                )
+                if verbose_logger.isEnabledFor(logging.WARNING):
+                    verbose_logger.warning(
+                        f"************* AWS Bedrock Claude Token Fix - Conditions Matched *************\n"
+                        f"api_base: {api_base}\n"
+                        f"litellm_model_name: {litellm_model_name}\n"
+                        f"Original prompt_tokens: {original_prompt_tokens}\n"
+                        f"cache_creation_input_tokens: {cache_creation_tokens}\n" 
+                        f"cache_read_input_tokens: {cache_read_tokens}\n"
+                        f"Corrected prompt_tokens: {original_prompt_tokens} + {cache_creation_tokens} + {cache_read_tokens} = {corrected_prompt_tokens}\n"
+                        f"Corrected total_tokens: {completion_tokens} + {corrected_prompt_tokens} = {corrected_total_tokens}"
+                    )
                 
                 # 应用修正
                 usage_dict["prompt_tokens"] = corrected_prompt_tokens
                 usage_dict["total_tokens"] = corrected_total_tokens
-            else:
-                # 调试：不满足条件时也记录
-                verbose_logger.warning(
-                    f"************* AWS Bedrock Claude Conditions Not Met *************\n"
-                    f"API condition: {is_aws_bedrock_api}\n"
-                    f"Model condition: {is_claude_model}\n"
-                    f"api_base: {api_base}\n"
-                    f"litellm_model_name: {litellm_model_name}"
-                )
 
         # 仅当明确是 kimi-k2-turbo-preview 时做映射
         if model_name == "kimi-k2-turbo-preview":
@@ -341,16 +365,18 @@ class MyCustomHandler(CustomLogger):
                 # 将 Kimi 的 cached_tokens 映射到 LiteLLM 标准字段
                 usage_dict["cache_read_input_tokens"] = kimi_cached_tokens
                 verbose_logger.warning(
-                    f"************* kimi-k2-turbo-preview - cached_tokens: {kimi_cached_tokens} -> cache_read_input_tokens *************"
+                    "************* kimi-k2-turbo-preview - cached_tokens: %s -> cache_read_input_tokens *************",
+                    kimi_cached_tokens,
                 )
             else:
                 # chunk 模式下，Kimi 可能不返回 cached_tokens，进行推断
-                prompt_tokens = usage_dict.get("prompt_tokens", 0)
-                verbose_logger.warning(f"************* Kimi inference: prompt_tokens={prompt_tokens}, threshold=100 *************")
+                prompt_tokens = usage_dict.get("prompt_tokens") or 0
+                verbose_logger.warning("************* Kimi inference: prompt_tokens=%s, threshold=100 *************", prompt_tokens)
                 if prompt_tokens > 100:
                     usage_dict["cache_read_input_tokens"] = prompt_tokens
                     verbose_logger.warning(
-                        f"************* kimi-k2-turbo-preview chunk - prompt_tokens: {prompt_tokens} -> cache_read_input_tokens *************"
+                        "************* kimi-k2-turbo-preview chunk - prompt_tokens: %s -> cache_read_input_tokens *************",
+                        prompt_tokens,
                     )
 
         cached_tokens = usage_dict.get("cache_read_input_tokens", 0)
@@ -378,12 +404,20 @@ class MyCustomHandler(CustomLogger):
         final_cost = custom_cost if is_valid else origin_cost
         
         verbose_logger.warning(
-            f"Cost calculation - Original: {origin_cost}, Custom: {custom_cost}, Final: {final_cost}"
+            "Cost calculation - Original: %s, Custom: %s, Final: %s", origin_cost, custom_cost, final_cost
         )
         
         if final_cost:
             kwargs["response_cost"] = final_cost
 
+    def _has_cost_info(self, kwargs) -> bool:
+        # 没有 deployment 也没有 model_info 时 _custom_calculate_cost 必然返回 (False, 0)
+        litellm_params = kwargs.get('litellm_params')
+        if not litellm_params or not isinstance(litellm_params, dict):
+            return False
+        metadata = litellm_params.get("metadata") or {}
+        return bool(metadata.get('deployment')) or metadata.get("model_info") is not None
+
     def _process_usage_info(self, usage_obj, kwargs, result):
         if not usage_obj:
             return kwargs, result
@@ -391,11 +425,13 @@ class MyCustomHandler(CustomLogger):
         try:
             # 获取模型名
             model_name = getattr(result, "model", None) or kwargs.get("model") or kwargs.get("litellm_params", {}).get("model")
-            verbose_logger.warning(f"************* _process_usage_info model_name: {model_name} *************")
+            verbose_logger.warning("************* _process_usage_info model_name: %s *************", model_name)
             
             usage_dict = self._preprocess_usage_dict(usage_obj, model_name, kwargs)  # 传递 model_name 和 kwargs
             self._update_logging_object(kwargs, usage_dict)
-            self._calculate_and_set_custom_cost(kwargs, usage_dict)
+            # 无法计算自定义 cost 时跳过，response_cost 保持原值
+            if self._has_cost_info(kwargs):
+                self._calculate_and_set_custom_cost(kwargs, usage_dict)
             
             setattr(result, "raw_usage", usage_obj)
             return kwargs, result
@@ -406,9 +442,9 @@ class MyCustomHandler(CustomLogger):
     async def async_logging_hook(
         self, kwargs: dict, result: Any, call_type: str
     ) -> Tuple[dict, Any]:
-        verbose_logger.warning(f"************* async_logging_hook *************")
+        verbose_logger.warning("************* async_logging_hook *************")
         usage_obj = getattr(result, "usage", None)
-        verbose_logger.warning(f"************* usage_obj: {usage_obj} *************")
+        verbose_logger.warning("************* usage_obj: %s *************", usage_obj)
         
         try:
             kwargs, result = self._process_usage_info(usage_obj, kwargs, result)
@@ -440,24 +476,25 @@ class MyCustomHandler(CustomLogger):
         verbose_logger.info("****************** async_pre_call_hook start ******************************")
         
         enable_cache = self._get_enable_cache(data)
-        verbose_logger.warning(f"session_id: {self._get_session_id(data)}, enable_cache: {enable_cache}")
+        verbose_logger.warning("session_id: %s, enable_cache: %s", self._get_session_id(data), enable_cache)
         if not enable_cache:
             return data
         
         # 应用patch
         self._patch_bedrock_messages_cache_control()
         
-        # 设置cache_control
-        for k, v in data.items():
-            if k == "messages":
-                for message in v:
-                    if message["role"] == Role.SYSTEM.value:
-                        message["cache_control"] = self._get_cache_control()
-                if len(v) > 0:
-                    v[-1]["cache_control"] = self._get_cache_control()
-            if k == "tools":
-                if len(v) > 0:
-                    v[-1]["cache_control"] = self._get_cache_control()
+        # 设置cache_control（同一个请求内共用一个 cache_control dict）
+        cache_control = self._get_cache_control()
+        messages = data.get("messages")
+        if messages:
+            system_role = Role.SYSTEM.value
+            for message in messages:
+                if message["role"] == system_role:
+                    message["cache_control"] = cache_control
+            messages[-1]["cache_control"] = cache_control
+        tools = data.get("tools")
+        if tools:
+            tools[-1]["cache_control"] = cache_control
         return data
     
     async def async_pre_call_check(
@@ -465,7 +502,7 @@ class MyCustomHandler(CustomLogger):
     ) -> Optional[dict]:
         model_name = self._get_model_name(deployment)
         model_id = self._get_model_id(deployment)
-        verbose_logger.info(f"************* async_pre_call_check model_name: {model_name}, model_id: {model_id}")
+        verbose_logger.info("************* async_pre_call_check model_name: %s, model_id: %s", model_name, model_id)
         return deployment
 
 
@@ -7,56 +7,130 @@ Query spans from Jaeger by trace ID and span name
 import requests
 import json
 import argparse
-from typing import Dict, List, Optional
+import sys
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # optional: faster JSON decoding/encoding of large traces
+    orjson = None
+
+
+def dump_json(obj) -> bytes:
+    """Serialize to indented UTF-8 JSON, using orjson when available"""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+def write_json(obj) -> None:
+    """Print obj as JSON, writing bytes directly when stdout has a buffer"""
+    buffer = getattr(sys.stdout, 'buffer', None)
+    if buffer is None:
+        # e.g. StringIO or a redirected text stream
+        sys.stdout.write(dump_json(obj).decode('utf-8') + "\n")
+        return
+    sys.stdout.flush()
+    buffer.write(dump_json(obj) + b"\n")
+    buffer.flush()
+
+
+# (connect, read) timeouts for Jaeger API requests
+REQUEST_TIMEOUT = (3.05, 30)
+
+
+class TraceIndex(NamedTuple):
+    """Lookup tables built once per trace"""
+    spans: List[Dict]
+    span_by_name: Dict[str, Dict]
+    children_by_parent: Dict[str, List[Dict]]
 
 
 class JaegerQueryTool:
+    __slots__ = ('jaeger_url', '_session')
+
     def __init__(self, jaeger_url: str = "http://localhost:16686"):
         self.jaeger_url = jaeger_url.rstrip('/')
 
+        # Reuse connections across requests
+        self._session = requests.Session()
+
     def get_trace(self, trace_id: str) -> Optional[Dict]:
         """Get a complete trace by trace ID"""
         url = f"{self.jaeger_url}/api/traces/{trace_id}"
 
         try:
-            response = requests.get(url)
+            response = self._session.get(url, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content) if orjson else response.json()
 
             if 'data' in data and len(data['data']) > 0:
                 return data['data'][0]
             return None
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, ValueError) as e:
             print(f"Error fetching trace: {e}")
             return None
 
-    def find_span_by_name(self, spans: List[Dict], span_name: str) -> Optional[Dict]:
-        """Find a span by operation name"""
-        for span in spans:
-            if span.get('operationName') == span_name:
-                return span
-        return None
+    def index_child_spans(self, all_spans: List[Dict]) -> Dict[str, List[Dict]]:
+        """Map each span ID to its direct child spans, in trace order"""
+        children_by_parent = defaultdict(list)
+
+        for span in all_spans:
+            for ref in span.get('references', ()):
+                if ref.get('refType') == 'CHILD_OF':
+                    children_by_parent[ref.get('spanID')].append(span)
+
+        return children_by_parent
+
+    def get_child_spans(self, parent_span_id: str, all_spans: List[Dict],
+                        children_by_parent: Optional[Dict[str, List[Dict]]] = None) -> List[Dict]:
+        """Get all descendant spans of a parent span (depth-first, pre-order)"""
+        if children_by_parent is None:
+            children_by_parent = self.index_child_spans(all_spans)
 
-    def get_child_spans(self, parent_span_id: str, all_spans: List[Dict]) -> List[Dict]:
-        """Get all child spans of a parent span"""
         children = []
+        stack = list(reversed(children_by_parent.get(parent_span_id, ())))
 
-        for span in all_spans:
-            if 'references' in span:
-                for ref in span['references']:
-                    if ref.get('refType') == 'CHILD_OF' and ref.get('spanID') == parent_span_id:
-                        children.append(span)
-                        # Recursively get children of this span
-                        children.extend(self.get_child_spans(span['spanID'], all_spans))
+        while stack:
+            span = stack.pop()
+            children.append(span)
+            stack.extend(reversed(children_by_parent.get(span['spanID'], ())))
 
         return children
 
-    def build_span_tree(self, root_span: Dict, all_spans: List[Dict]) -> Dict:
-        """Build a span tree with the root span and all its descendants"""
-        span_tree = root_span.copy()
+    def index_trace(self, all_spans: List[Dict]) -> TraceIndex:
+        """Build name and parent -> children lookups for a trace's spans"""
+        span_by_name = {}
+        for span in all_spans:
+            # Keep the first span with each name
+            span_by_name.setdefault(span.get('operationName'), span)
+
+        return TraceIndex(all_spans, span_by_name, self.index_child_spans(all_spans))
+
+    def get_trace_index(self, trace_id: str) -> Optional[TraceIndex]:
+        """Fetch a trace and index its spans"""
+        trace = self.get_trace(trace_id)
+
+        if not trace:
+            print(f"Trace not found: {trace_id}")
+            return None
+
+        if 'spans' not in trace:
+            print("No spans found in trace")
+            return None
 
+        return self.index_trace(trace['spans'])
+
+    def build_span_tree(self, root_span: Dict, all_spans: List[Dict],
+                        children_by_parent: Optional[Dict[str, List[Dict]]] = None) -> Dict:
+        """Build a span tree with the root span and all its descendants"""
         # Get all child spans
-        children = self.get_child_spans(root_span['spanID'], all_spans)
+        if children_by_parent is None:
+            children_by_parent = self.index_child_spans(all_spans)
+        children = self.get_child_spans(root_span['spanID'], all_spans, children_by_parent)
+
+        span_tree = root_span.copy()
 
         if children:
             span_tree['childSpans'] = children
@@ -76,12 +150,10 @@ class JaegerQueryTool:
         output.append(f"{prefix}Start Time: {span.get('startTime')}")
 
         # Tags
-        if 'tags' in span and span['tags']:
+        tags = span.get('tags')
+        if tags:
             output.append(f"{prefix}Tags:")
-            for tag in span['tags']:
-                key = tag.get('key')
-                value = tag.get('value', '')
-                output.append(f"{prefix}  {key}: {value}")
+            output.extend(f"{prefix}  {tag.get('key')}: {tag.get('value', '')}" for tag in tags)
 
         # Logs
         if 'logs' in span and span['logs']:
@@ -90,12 +162,36 @@ class JaegerQueryTool:
         # Child spans
         if 'childSpans' in span:
             output.append(f"{prefix}Child Spans: {len(span['childSpans'])}")
+            append = output.append
+            format_child = self.format_span_output
             for child in span['childSpans']:
-                output.append("")
-                output.append(self.format_span_output(child, indent + 1))
+                append("")
+                append(format_child(child, indent + 1))
 
         return "\n".join(output)
 
+    def find_span_tree(self, index: TraceIndex, span_name: str) -> Optional[Dict]:
+        """Build the span tree for span_name from an indexed trace, or None if absent"""
+        target_span = index.span_by_name.get(span_name)
+
+        if not target_span:
+            return None
+
+        return self.build_span_tree(target_span, index.spans, index.children_by_parent)
+
+    def print_span_not_found(self, index: TraceIndex, span_name: str) -> None:
+        """Report a missing span along with the spans the trace does have"""
+        lines = [f"Span not found: {span_name}", "", "Available spans in this trace:"]
+        lines.extend(f"  - {span.get('operationName')}" for span in index.spans)
+        sys.stdout.write("\n".join(lines) + "\n")
+
+    def print_span_tree(self, span_tree: Dict, output_format: str = 'json') -> None:
+        """Print a span tree as JSON or in the readable format"""
+        if output_format == 'pretty':
+            sys.stdout.write("\n=== Span Tree ===\n\n" + self.format_span_output(span_tree) + "\n\n\n")
+        else:
+            write_json(span_tree)
+
     def query_span(self, trace_id: str, span_name: str, output_format: str = 'json') -> Optional[Dict]:
         """
         Query a span and its children by trace ID and span name
@@ -109,40 +205,81 @@ class JaegerQueryTool:
             Span tree as dictionary or None if not found
         """
         # Get the trace
-        trace = self.get_trace(trace_id)
+        index = self.get_trace_index(trace_id)
 
-        if not trace:
-            print(f"Trace not found: {trace_id}")
+        if index is None:
             return None
 
-        if 'spans' not in trace:
-            print("No spans found in trace")
+        # Find the target span and build its tree
+        span_tree = self.find_span_tree(index, span_name)
+
+        if span_tree is None:
+            self.print_span_not_found(index, span_name)
             return None
 
-        all_spans = trace['spans']
+        self.print_span_tree(span_tree, output_format)
 
-        # Find the target span
-        target_span = self.find_span_by_name(all_spans, span_name)
+        return span_tree
 
-        if not target_span:
-            print(f"Span not found: {span_name}")
-            print(f"\nAvailable spans in this trace:")
-            for span in all_spans:
-                print(f"  - {span.get('operationName')}")
-            return None
 
-        # Build span tree with children
-        span_tree = self.build_span_tree(target_span, all_spans)
+def run(trace_id: str, span_names: Union[str, Iterable[str]], url: str = 'http://localhost:16686',
+        output_format: str = 'json', output: Optional[str] = None) -> Dict[str, Optional[Dict]]:
+    """
+    Query one or more spans from a trace without going through argparse
 
-        # Output based on format
-        if output_format == 'pretty':
-            print("\n=== Span Tree ===\n")
-            print(self.format_span_output(span_tree))
-            print("\n")
-        else:
-            print(json.dumps(span_tree, indent=2))
+    Args:
+        trace_id: The trace ID
+        span_names: Operation name, or names, of the spans to find
+        url: Jaeger UI URL
+        output_format: Output format ('json' or 'pretty')
+        output: Optional file path to save the result to
 
-        return span_tree
+    Returns:
+        Span trees keyed by span name (None for spans not found), or an
+        empty dict if the trace could not be fetched
+    """
+    if isinstance(span_names, str):
+        span_names = [span_names]
+
+    # Create query tool
+    tool = JaegerQueryTool(jaeger_url=url)
+
+    # Fetch and index the trace once for all span names
+    index = tool.get_trace_index(trace_id)
+
+    if index is None:
+        return {}
+
+    span_trees = {}
+    for span_name in span_names:
+        span_tree = tool.find_span_tree(index, span_name)
+        if span_tree is None:
+            tool.print_span_not_found(index, span_name)
+        span_trees[span_name] = span_tree
+
+    if len(span_trees) == 1:
+        result = next(iter(span_trees.values()))
+    else:
+        # Multiple span names: the found trees keyed by span name
+        result = {name: tree for name, tree in span_trees.items() if tree}
+
+    if not result:
+        return span_trees
+
+    # Print the same object that is saved to the output file
+    if output_format == 'pretty' and len(span_trees) > 1:
+        for span_tree in result.values():
+            tool.print_span_tree(span_tree, output_format)
+    else:
+        tool.print_span_tree(result, output_format)
+
+    # Save to file if specified
+    if output:
+        with open(output, 'wb') as f:
+            f.write(dump_json(result))
+        print(f"\nOutput saved to: {output}")
+
+    return span_trees
 
 
 def main():
@@ -154,6 +291,9 @@ Examples:
   # Query span and output JSON
   python query_span.py --trace-id abc123 --span-name "POST /chat/completions"
 
+  # Query several spans from the same trace
+  python query_span.py --trace-id abc123 --span-name "POST /chat/completions" "litellm_request"
+
   # Query span with pretty output
   python query_span.py --trace-id abc123 --span-name "POST /chat/completions" --format pretty
 
@@ -174,7 +314,8 @@ Examples:
     parser.add_argument(
         '--span-name',
         required=True,
-        help='Span operation name to find'
+        nargs='+',
+        help='Span operation name(s) to find'
     )
 
     parser.add_argument(
@@ -197,17 +338,7 @@ Examples:
 
     args = parser.parse_args()
 
-    # Create query tool
-    tool = JaegerQueryTool(jaeger_url=args.url)
-
-    # Query the span
-    span_tree = tool.query_span(args.trace_id, args.span_name, args.format)
-
-    # Save to file if specified
-    if args.output and span_tree:
-        with open(args.output, 'w') as f:
-            json.dump(span_tree, f, indent=2)
-        print(f"\nOutput saved to: {args.output}")
+    run(args.trace_id, args.span_name, url=args.url, output_format=args.format, output=args.output)
 
 
 if __name__ == "__main__":
@@ -14,15 +14,110 @@ import os
 from typing import Optional
 
 from litellm._logging import verbose_logger
+from litellm.integrations.custom_logger import CustomLogger
+from litellm.integrations._types.open_inference import (
+    MessageAttributes,
+    OpenInferenceSpanKindValues,
+    SpanAttributes,
+)
 from litellm.integrations.opentelemetry import (
     OpenTelemetry,
     OpenTelemetryConfig,
 )
+from litellm.litellm_core_utils.safe_json_dumps import safe_dumps
+from litellm.types.utils import StandardLoggingPayload
+
+try:
+    import orjson
+except ImportError:  # optional: faster serialization of span payloads
+    orjson = None
 
 # Constants for OTEL tracing/metrics
 LITELLM_TRACER_NAME = os.getenv("OTEL_TRACER_NAME", "litellm")
 
 
+def _read_max_attr_len() -> int:
+    """Parse GRAVITY_OTEL_MAX_ATTR_LEN; bad or negative values mean no limit"""
+    raw = os.getenv("GRAVITY_OTEL_MAX_ATTR_LEN")
+    if not raw:
+        return 0
+    try:
+        return max(int(raw), 0)
+    except ValueError:
+        # A typo here must not stop the proxy from loading its callbacks
+        verbose_logger.warning(
+            "[OpenInference] Ignoring invalid GRAVITY_OTEL_MAX_ATTR_LEN=%r, content is not truncated", raw
+        )
+        return 0
+
+
+# Longest message content (in characters) recorded on a span attribute; 0 = no limit (default)
+_MAX_ATTR_LEN = _read_max_attr_len()
+_TRUNCATED_MARKER = "...[truncated]"
+
+# OpenInference attribute keys, resolved once at import time
+_MSG_ROLE = MessageAttributes.MESSAGE_ROLE
+_MSG_CONTENT = MessageAttributes.MESSAGE_CONTENT
+_LLM_INPUT_MESSAGES = SpanAttributes.LLM_INPUT_MESSAGES
+_LLM_OUTPUT_MESSAGES = SpanAttributes.LLM_OUTPUT_MESSAGES
+_LLM_TOOLS = SpanAttributes.LLM_TOOLS
+_TOOL_NAME = SpanAttributes.TOOL_NAME
+_TOOL_DESCRIPTION = SpanAttributes.TOOL_DESCRIPTION
+_TOOL_PARAMETERS = SpanAttributes.TOOL_PARAMETERS
+_SPAN_KIND_LLM = OpenInferenceSpanKindValues.LLM.value
+# optional_params key -> span attribute key
+_OPT_PARAM_MAP = (
+    ("max_tokens", "llm.request.max_tokens"),
+    ("temperature", "llm.request.temperature"),
+    ("top_p", "llm.request.top_p"),
+    ("user", "llm.user"),
+)
+# Per-message key suffixes, appended to "<messages key>.<idx>"
+_ROLE_SUFFIX = f".{_MSG_ROLE}"
+_CONTENT_SUFFIX = f".{_MSG_CONTENT}"
+
+def _truncate(value, cast):
+    """Cast value to its attribute form, then cap it at _MAX_ATTR_LEN characters"""
+    if not _MAX_ATTR_LEN:
+        return value
+    # Lists (e.g. multimodal content parts) become strings here, so they are capped too
+    value = cast(value)
+    if isinstance(value, str) and len(value) > _MAX_ATTR_LEN:
+        return value[:_MAX_ATTR_LEN] + _TRUNCATED_MARKER
+    return value
+
+
+def _fast_dumps(obj) -> str:
+    """Serialize with orjson when available, falling back to LiteLLM's safe_dumps"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(
+                obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+            ).decode()
+        except TypeError:
+            pass
+    return safe_dumps(obj)
+
+
+def _compute_latencies(standard_logging_payload):
+    """
+    Return (time_to_first_token, token_generation, total) in seconds, or None
+    when TTFT is unavailable. The last two are None without an end time.
+    """
+    if not standard_logging_payload:
+        return None
+
+    start = standard_logging_payload.get("startTime")
+    completion_start = standard_logging_payload.get("completionStartTime")
+    if not (start and completion_start):
+        return None
+
+    end = standard_logging_payload.get("endTime")
+    if not end:
+        return completion_start - start, None, None
+    return completion_start - start, end - completion_start, end - start
+
+
 class OpenInferenceOtelLogger(OpenTelemetry):
     """
     Pure OpenInference OTEL logger (Arize Phoenix style).
@@ -43,6 +138,9 @@ class OpenInferenceOtelLogger(OpenTelemetry):
     - OTEL_EXPORTER_OTLP_HEADERS: Optional headers (if needed)
     - LITELLM_OTEL_INTEGRATION_ENABLE_METRICS: Enable metrics (true/false)
     - LITELLM_OTEL_INTEGRATION_ENABLE_EVENTS: Enable events/logs (true/false)
+    - GRAVITY_OTEL_MAX_ATTR_LEN: Max characters of message content per attribute.
+      Unset, 0 or invalid means content is never truncated, so set it (e.g. 8192)
+      to guard against very large prompts/responses on spans
     """
 
     def __init__(self, *args, **kwargs):
@@ -59,13 +157,13 @@ class OpenInferenceOtelLogger(OpenTelemetry):
         # Call parent constructor
         super().__init__(*args, **kwargs)
 
-        verbose_logger.info(
-            "✓ OpenInference OTEL Logger initialized (pure OpenInference/Arize Phoenix style)"
+        verbose_logger.debug(
+            "OpenInference OTEL Logger initialized endpoint=%s protocol=%s metrics=%s events=%s",
+            config.endpoint,
+            config.exporter,
+            config.enable_metrics,
+            config.enable_events,
         )
-        verbose_logger.info(f"  Endpoint: {config.endpoint}")
-        verbose_logger.info(f"  Protocol: {config.exporter}")
-        verbose_logger.info(f"  Metrics: {config.enable_metrics}")
-        verbose_logger.info(f"  Events: {config.enable_events}")
 
     def _init_metrics(self, meter_provider):
         """
@@ -84,10 +182,13 @@ class OpenInferenceOtelLogger(OpenTelemetry):
                 description="Time to first token (prompt processing latency)",
                 unit="s",
             )
-            verbose_logger.info("  TTFT Metric: Enabled")
+            verbose_logger.debug("OpenInference OTEL Logger TTFT metric enabled")
         else:
             self._ttft_histogram = None
 
+        # Bound once so each span does a single attribute read to record TTFT
+        self._ttft_record = self._ttft_histogram.record if self._ttft_histogram is not None else None
+
     def _record_metrics(self, kwargs, response_obj, start_time, end_time):
         """
         Override to record TTFT metric.
@@ -96,19 +197,16 @@ class OpenInferenceOtelLogger(OpenTelemetry):
         super()._record_metrics(kwargs, response_obj, start_time, end_time)
 
         # Record TTFT if available
-        if self._ttft_histogram:
-            standard_logging_payload = kwargs.get("standard_logging_object")
-            if standard_logging_payload:
-                start = standard_logging_payload.get("startTime")
-                completion_start = standard_logging_payload.get("completionStartTime")
-
-                if start and completion_start:
-                    ttft_seconds = completion_start - start
+        ttft_record = self._ttft_record
+        if ttft_record is not None:
+            latencies = _compute_latencies(kwargs.get("standard_logging_object"))
+            if latencies is not None:
+                ttft_seconds = latencies[0]
 
-                    # Get common attributes from parent (model, provider, etc.)
-                    common_attrs = self._get_common_metric_attributes(kwargs, response_obj)
+                # Get common attributes from parent (model, provider, etc.)
+                common_attrs = self._get_common_metric_attributes(kwargs, response_obj)
 
-                    self._ttft_histogram.record(ttft_seconds, attributes=common_attrs)
+                ttft_record(ttft_seconds, attributes=common_attrs)
 
     def _get_common_metric_attributes(self, kwargs, response_obj):
         """
@@ -134,6 +232,12 @@ class OpenInferenceOtelLogger(OpenTelemetry):
 
         This bypasses the callback_name routing in the parent class
         and uses a custom implementation that handles both nested and flattened tool formats.
+
+        Attributes are set synchronously on purpose: the parent ends the span right
+        after this returns, and an ended span ignores further attributes, so this
+        work cannot be handed to a background queue without also taking over span
+        ending. LiteLLM already runs success logging after the response has been
+        returned to the client, so this is not on the request's critical path.
         """
         # Use our custom OpenInference attribute setter (defined below)
         self._set_openinference_attributes(span, kwargs, response_obj)
@@ -157,15 +261,16 @@ class OpenInferenceOtelLogger(OpenTelemetry):
 
         This is based on litellm.integrations.arize._utils.set_attributes but includes
         a fix to handle both nested and flattened tool formats.
+
+        Attributes are collected into a dict and applied with a single
+        span.set_attributes() call instead of one SDK call per attribute.
         """
-        import json
-        from litellm.integrations._types.open_inference import (
-            MessageAttributes,
-            OpenInferenceSpanKindValues,
-            SpanAttributes,
-        )
-        from litellm.litellm_core_utils.safe_json_dumps import safe_dumps
-        from litellm.types.utils import StandardLoggingPayload
+        # Sampled-out spans drop attributes anyway; skip building them
+        if not span.is_recording():
+            return
+
+        attrs = {}
+        cast = self._cast_as_primitive_value_type
 
         try:
             optional_params = kwargs.get("optional_params", {})
@@ -176,137 +281,174 @@ class OpenInferenceOtelLogger(OpenTelemetry):
             if standard_logging_payload is None:
                 raise ValueError("standard_logging_object not found in kwargs")
 
+            # Read the payload fields used below once
+            slp = standard_logging_payload
+            metadata = slp.get("metadata")
+            call_type = slp["call_type"]
+            model_params = slp.get("model_parameters")
+
             # Set metadata
-            metadata = standard_logging_payload.get("metadata") if standard_logging_payload else None
             if metadata is not None:
-                self.safe_set_attribute(span, SpanAttributes.METADATA, safe_dumps(metadata))
+                attrs[SpanAttributes.METADATA] = _fast_dumps(metadata)
 
             # Set model name
             if kwargs.get("model"):
-                self.safe_set_attribute(span, SpanAttributes.LLM_MODEL_NAME, kwargs.get("model"))
+                attrs[SpanAttributes.LLM_MODEL_NAME] = kwargs.get("model")
 
             # Set request type
-            self.safe_set_attribute(span, "llm.request.type", standard_logging_payload["call_type"])
+            attrs["llm.request.type"] = call_type
 
             # Set provider
-            self.safe_set_attribute(
-                span,
-                SpanAttributes.LLM_PROVIDER,
-                litellm_params.get("custom_llm_provider", "Unknown"),
-            )
+            attrs[SpanAttributes.LLM_PROVIDER] = litellm_params.get("custom_llm_provider", "Unknown")
 
-            # Set optional params
-            if optional_params.get("max_tokens"):
-                self.safe_set_attribute(span, "llm.request.max_tokens", optional_params.get("max_tokens"))
-            if optional_params.get("temperature"):
-                self.safe_set_attribute(span, "llm.request.temperature", optional_params.get("temperature"))
-            if optional_params.get("top_p"):
-                self.safe_set_attribute(span, "llm.request.top_p", optional_params.get("top_p"))
+            # Set optional params (max_tokens, temperature, top_p, user) when present
+            for param, attr_key in _OPT_PARAM_MAP:
+                value = optional_params.get(param)
+                if value is not None:
+                    attrs[attr_key] = value
 
             # Set streaming flag
-            self.safe_set_attribute(span, "llm.is_streaming", str(optional_params.get("stream", False)))
+            attrs["llm.is_streaming"] = "true" if optional_params.get("stream") else "false"
 
-            # Set user if present
-            if optional_params.get("user"):
-                self.safe_set_attribute(span, "llm.user", optional_params.get("user"))
+            # Response accessor (None when response_obj is missing or not dict-like)
+            response_get = getattr(response_obj, "get", None)
 
             # Set response ID and model
-            if response_obj and response_obj.get("id"):
-                self.safe_set_attribute(span, "llm.response.id", response_obj.get("id"))
-            if response_obj and response_obj.get("model"):
-                self.safe_set_attribute(span, "llm.response.model", response_obj.get("model"))
+            if response_get is not None:
+                response_id = response_get("id")
+                if response_id:
+                    attrs["llm.response.id"] = response_id
+                response_model = response_get("model")
+                if response_model:
+                    attrs["llm.response.model"] = response_model
 
             # Set span kind
-            self.safe_set_attribute(
-                span,
-                SpanAttributes.OPENINFERENCE_SPAN_KIND,
-                OpenInferenceSpanKindValues.LLM.value,
-            )
+            attrs[SpanAttributes.OPENINFERENCE_SPAN_KIND] = _SPAN_KIND_LLM
 
             # Set input messages
             messages = kwargs.get("messages")
             if messages:
-                last_message = messages[-1]
-                self.safe_set_attribute(span, SpanAttributes.INPUT_VALUE, last_message.get("content", ""))
+                last_idx = len(messages) - 1
+                last_content = _truncate(messages[last_idx].get("content", ""), cast)
+                attrs[SpanAttributes.INPUT_VALUE] = last_content
 
+                role_suffix, content_suffix = _ROLE_SUFFIX, _CONTENT_SUFFIX
                 for idx, msg in enumerate(messages):
-                    prefix = f"{SpanAttributes.LLM_INPUT_MESSAGES}.{idx}"
-                    self.safe_set_attribute(span, f"{prefix}.{MessageAttributes.MESSAGE_ROLE}", msg.get("role"))
-                    self.safe_set_attribute(span, f"{prefix}.{MessageAttributes.MESSAGE_CONTENT}", msg.get("content", ""))
+                    prefix = f"{_LLM_INPUT_MESSAGES}.{idx}"
+                    attrs[prefix + role_suffix] = msg.get("role")
+                    # The last message's content is already in INPUT_VALUE; reuse that string
+                    attrs[prefix + content_suffix] = (
+                        last_content if idx == last_idx else _truncate(msg.get("content", ""), cast)
+                    )
 
             # Set tools (function definitions) - WITH FIX FOR FLATTENED FORMAT
             tools = optional_params.get("tools")
             if tools:
-                for idx, tool in enumerate(tools):
-                    # Handle both formats:
-                    # 1. OpenAI nested format: {"type": "function", "function": {"name": "...", "description": "...", "parameters": {...}}}
-                    # 2. Flattened format: {"name": "...", "description": "...", "parameters": {...}, "type": "function"}
-                    function = tool.get("function")
-                    if not function:
-                        # Flattened format - use the tool object directly
-                        if "name" in tool:
-                            function = tool
-                        else:
-                            continue
-
-                    prefix = f"{SpanAttributes.LLM_TOOLS}.{idx}"
-                    self.safe_set_attribute(span, f"{prefix}.{SpanAttributes.TOOL_NAME}", function.get("name"))
-                    self.safe_set_attribute(span, f"{prefix}.{SpanAttributes.TOOL_DESCRIPTION}", function.get("description"))
-                    self.safe_set_attribute(span, f"{prefix}.{SpanAttributes.TOOL_PARAMETERS}", json.dumps(function.get("parameters")))
+                self._add_tool_attributes(attrs, tools)
 
             # Set invocation parameters
-            model_params = standard_logging_payload.get("model_parameters") if standard_logging_payload else None
             if model_params:
-                self.safe_set_attribute(span, SpanAttributes.LLM_INVOCATION_PARAMETERS, safe_dumps(model_params))
+                attrs[SpanAttributes.LLM_INVOCATION_PARAMETERS] = _fast_dumps(model_params)
                 if model_params.get("user"):
                     user_id = model_params.get("user")
                     if user_id is not None:
-                        self.safe_set_attribute(span, SpanAttributes.USER_ID, user_id)
+                        attrs[SpanAttributes.USER_ID] = user_id
 
             # Set TTFT timing (Time to First Token) - Following OpenInference naming pattern
-            if standard_logging_payload:
-                start = standard_logging_payload.get("startTime")
-                completion_start = standard_logging_payload.get("completionStartTime")
-                end = standard_logging_payload.get("endTime")
-
-                if start and completion_start:
-                    # Time to first token (prompt processing latency)
-                    ttft_seconds = completion_start - start
-                    self.safe_set_attribute(span, "llm.latency.time_to_first_token", ttft_seconds)
+            latencies = _compute_latencies(standard_logging_payload)
+            if latencies is not None:
+                ttft_seconds, token_gen_time, total_latency = latencies
 
-                    # Optional: Token generation time (time from first to last token)
-                    if end:
-                        token_gen_time = end - completion_start
-                        self.safe_set_attribute(span, "llm.latency.token_generation", token_gen_time)
+                # Time to first token (prompt processing latency)
+                attrs["llm.latency.time_to_first_token"] = ttft_seconds
 
-                        # Total latency
-                        total_latency = end - start
-                        self.safe_set_attribute(span, "llm.latency.total", total_latency)
+                # Optional: Token generation time (time from first to last token) and total latency
+                if token_gen_time is not None:
+                    attrs["llm.latency.token_generation"] = token_gen_time
+                    attrs["llm.latency.total"] = total_latency
 
             # Set output messages and tokens
-            if hasattr(response_obj, "get"):
-                for idx, choice in enumerate(response_obj.get("choices", [])):
-                    response_message = choice.get("message", {})
-                    self.safe_set_attribute(span, SpanAttributes.OUTPUT_VALUE, response_message.get("content", ""))
+            if response_get is not None:
+                choices = response_get("choices") or []
+                usage = response_get("usage")
+
+                if choices:
+                    attrs[SpanAttributes.OUTPUT_VALUE] = _truncate(
+                        choices[0].get("message", {}).get("content", ""), cast
+                    )
 
-                    prefix = f"{SpanAttributes.LLM_OUTPUT_MESSAGES}.{idx}"
-                    self.safe_set_attribute(span, f"{prefix}.{MessageAttributes.MESSAGE_ROLE}", response_message.get("role"))
-                    self.safe_set_attribute(span, f"{prefix}.{MessageAttributes.MESSAGE_CONTENT}", response_message.get("content", ""))
+                role_suffix, content_suffix = _ROLE_SUFFIX, _CONTENT_SUFFIX
+                for idx, choice in enumerate(choices):
+                    response_message = choice.get("message", {})
+                    prefix = f"{_LLM_OUTPUT_MESSAGES}.{idx}"
+                    attrs[prefix + role_suffix] = response_message.get("role")
+                    attrs[prefix + content_suffix] = _truncate(response_message.get("content", ""), cast)
 
                 # Set token usage
-                usage = response_obj and response_obj.get("usage")
                 if usage:
-                    self.safe_set_attribute(span, SpanAttributes.LLM_TOKEN_COUNT_TOTAL, usage.get("total_tokens"))
-                    self.safe_set_attribute(span, SpanAttributes.LLM_TOKEN_COUNT_COMPLETION, usage.get("completion_tokens"))
-                    self.safe_set_attribute(span, SpanAttributes.LLM_TOKEN_COUNT_PROMPT, usage.get("prompt_tokens"))
+                    attrs[SpanAttributes.LLM_TOKEN_COUNT_TOTAL] = usage.get("total_tokens")
+                    attrs[SpanAttributes.LLM_TOKEN_COUNT_COMPLETION] = usage.get("completion_tokens")
+                    attrs[SpanAttributes.LLM_TOKEN_COUNT_PROMPT] = usage.get("prompt_tokens")
 
         except Exception as e:
             verbose_logger.error(f"[OpenInference] Failed to set span attributes: {e}")
             if hasattr(span, "record_exception"):
                 span.record_exception(e)
 
+        # Apply everything collected so far in one SDK call (same value casting as safe_set_attribute)
+        if attrs:
+            span.set_attributes({key: cast(value) for key, value in attrs.items()})
+
+    def _add_tool_attributes(self, attrs, tools):
+        """
+        Add tool (function definition) attributes to attrs.
 
-# Create a singleton instance for LiteLLM to use
-# LiteLLM will import this instance when you specify:
-# callbacks: openinference_otel.openinference_logger
-openinference_logger = OpenInferenceOtelLogger()
+        Kept out of _set_openinference_attributes so the common no-tools
+        path stays straight-line code.
+        """
+        for idx, tool in enumerate(tools):
+            # Handle both formats:
+            # 1. OpenAI nested format: {"type": "function", "function": {"name": "...", "description": "...", "parameters": {...}}}
+            # 2. Flattened format: {"name": "...", "description": "...", "parameters": {...}, "type": "function"}
+            function = tool.get("function")
+            if not function:
+                # Flattened format - use the tool object directly
+                if "name" in tool:
+                    function = tool
+                else:
+                    continue
+
+            prefix = f"{_LLM_TOOLS}.{idx}"
+            attrs[f"{prefix}.{_TOOL_NAME}"] = function.get("name")
+            attrs[f"{prefix}.{_TOOL_DESCRIPTION}"] = function.get("description")
+            attrs[f"{prefix}.{_TOOL_PARAMETERS}"] = _fast_dumps(function.get("parameters"))
+
+
+class NoopLogger(CustomLogger):
+    """
+    Logger that does nothing, used when GRAVITY_DISABLE_OTEL=1 (e.g. test runs).
+    """
+
+
+_openinference_logger = None
+
+
+def __getattr__(name):
+    """
+    Create the singleton instance for LiteLLM lazily (PEP 562).
+
+    LiteLLM will import this instance when you specify:
+    callbacks: openinference_otel.openinference_logger
+
+    Building it on first access instead of at import time keeps importing this
+    module free of exporter setup and background threads.
+    """
+    global _openinference_logger
+    if name == "openinference_logger":
+        if _openinference_logger is None:
+            if os.getenv("GRAVITY_DISABLE_OTEL") == "1":
+                _openinference_logger = NoopLogger()
+            else:
+                _openinference_logger = OpenInferenceOtelLogger()
+        return _openinference_logger
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")